@@ -7,12 +7,34 @@ characteristics, and generates comprehensive visualizations and summaries of the
 # Import required libraries
 import pandas as pd
 import numpy as np
+import faiss
 from sklearn.cluster import KMeans
 from sklearn.decomposition import PCA
 from sklearn.manifold import TSNE
+from sklearn.metrics import pairwise_distances_argmin_min
+import functools
+import hashlib
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from importlib.util import find_spec
+import matplotlib
+
+# With no display (CI, Docker, SSH sessions), render straight to PNG with the
+# non-interactive Agg backend and skip plt.show()
+headless = sys.platform.startswith('linux') and not (
+    os.environ.get('DISPLAY') or os.environ.get('WAYLAND_DISPLAY'))
+if headless:
+    matplotlib.use('Agg')
+
 import matplotlib.pyplot as plt
 import seaborn as sns
-import os
+
+try:
+    # Numba JIT-compiles the per-cluster tally kernel (optional)
+    from numba import njit
+except ImportError:
+    njit = None
 
 # Set style for better-looking plots
 plt.style.use('default')
@@ -32,74 +54,342 @@ metadata_file = os.path.join(script_dir, 'CVE_metadata_1000.tsv')
 print(f"Loading vectors from: {vectors_file}")
 print(f"Loading metadata from: {metadata_file}")
 
-embeddings = np.loadtxt(vectors_file, delimiter='\t')
-print(f"Loaded embeddings shape: {embeddings.shape}")
+# pandas' C parser is much faster than np.loadtxt, and float32 halves the memory
+embeddings = pd.read_csv(vectors_file, sep='\t', header=None, dtype=np.float32,
+                         engine='c', memory_map=True).to_numpy()
+# Every downstream step (FAISS, PCA, t-SNE) works on float32, C-contiguous data;
+# DataFrame.to_numpy() can return a column-major (Fortran-ordered) array
+embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+print(f"Loaded embeddings shape: {embeddings.shape}, dtype: {embeddings.dtype}")
+
+# Expensive results are cached under cache/, keyed on the vectors file contents
+cache_dir = os.path.join(script_dir, 'cache')
+with open(vectors_file, 'rb') as f:
+    vectors_key = hashlib.sha256(f.read()).hexdigest()[:16]
 
 # Load metadata - tab-separated values with header
 metadata = pd.read_csv(metadata_file, delimiter='\t')
 print(f"Loaded metadata shape: {metadata.shape}")
 print(f"Metadata columns: {list(metadata.columns)}")
 
-# Perform clustering on embeddings
-print("\nPerforming K-means clustering...")
+
+def kmeans_parallel_init(X, k, oversampling=None, seed=42):
+    """
+    Pick k seed centroids with k-means|| (scalable k-means++, Bahmani et al.).
+
+    Instead of k sequential passes, each round samples ~oversampling points at
+    once with probability proportional to their squared distance to the current
+    candidates. The O(k log n) weighted candidates are then reduced to k seeds
+    with a regular (k-means++ seeded) KMeans.
+    """
+    rng = np.random.default_rng(seed)
+    n = X.shape[0]
+    oversampling = oversampling or 2 * k
+
+    # Start from a single uniformly chosen point
+    candidates = X[rng.integers(n)][None, :]
+    _, min_dist = pairwise_distances_argmin_min(X, candidates)
+    min_dist_sq = min_dist ** 2
+
+    # O(log psi) rounds, where psi is the cost of the initial single-center solution
+    psi = min_dist_sq.sum()
+    n_rounds = int(np.clip(np.ceil(np.log(psi)), 1, 10)) if psi > 1 else 1
+
+    for _ in range(n_rounds):
+        cost = min_dist_sq.sum()
+        if cost == 0:
+            break
+        # Sample every point independently (vectorized) with p ∝ min-distance²
+        picked = rng.random(n) < oversampling * min_dist_sq / cost
+        if not picked.any():
+            continue
+        new_candidates = X[picked]
+        candidates = np.vstack([candidates, new_candidates])
+        _, dist = pairwise_distances_argmin_min(X, new_candidates)
+        min_dist_sq = np.minimum(min_dist_sq, dist ** 2)
+
+    # Top up with random points in the (unlikely) case we sampled too few
+    if len(candidates) < k:
+        extra = X[rng.choice(n, size=k - len(candidates), replace=False)]
+        candidates = np.vstack([candidates, extra])
+
+    # Weight each candidate by the number of points closest to it, then
+    # distill the candidates down to k seeds with a weighted k-means
+    closest, _ = pairwise_distances_argmin_min(X, candidates)
+    weights = np.bincount(closest, minlength=len(candidates))
+    reducer = KMeans(n_clusters=k, n_init=1, random_state=seed)
+    reducer.fit(candidates, sample_weight=weights)
+    return np.ascontiguousarray(reducer.cluster_centers_, dtype='float32')
+
+def batch_parallel_kmeans(X, k, n_shards=None, seed=42):
+    """
+    Two-stage k-means for large datasets.
+
+    X is split into n_shards shards that are clustered in parallel, each seeded
+    with k-means||. The n_shards * k local centroids are then re-clustered into
+    k global centroids, weighted by how many points each one stands in for.
+    """
+    n_cpus = os.cpu_count() or 1
+    n_shards = n_shards or n_cpus
+    shards = np.array_split(X, n_shards)
+
+    def cluster_shard(i):
+        seed_centroids = kmeans_parallel_init(shards[i], k, seed=seed + i)
+        shard_kmeans = faiss.Kmeans(d=X.shape[1], k=k, niter=20, seed=seed + i, verbose=False)
+        shard_kmeans.train(shards[i], init_centroids=seed_centroids)
+        _, nearest = shard_kmeans.index.search(shards[i], 1)
+        return shard_kmeans.centroids, np.bincount(nearest.ravel(), minlength=k)
+
+    # FAISS releases the GIL while training, so threads run the shards in
+    # parallel (worker processes would re-execute this top-level script).
+    # Split the OpenMP threads between shards to avoid oversubscription.
+    omp_threads = faiss.omp_get_max_threads()
+    faiss.omp_set_num_threads(max(1, n_cpus // n_shards))
+    try:
+        with ThreadPoolExecutor(max_workers=n_shards) as pool:
+            shard_centroids, shard_counts = zip(*pool.map(cluster_shard, range(n_shards)))
+    finally:
+        faiss.omp_set_num_threads(omp_threads)
+
+    reducer = KMeans(n_clusters=k, n_init=10, random_state=seed)
+    reducer.fit(np.vstack(shard_centroids), sample_weight=np.concatenate(shard_counts))
+    return np.ascontiguousarray(reducer.cluster_centers_, dtype=np.float32)
+
+def tsne_backend():
+    """
+    Name of the fastest t-SNE implementation that is installed.
+
+    Uses find_spec, which locates a package without importing it, so a cached
+    run never loads CUDA or FIt-SNE just to pick the cache key.
+    """
+    # tsne-cuda runs t-SNE on the GPU and mirrors the scikit-learn API (optional)
+    if find_spec('tsnecuda') is not None:
+        return 'tsnecuda'
+    # FIt-SNE's Python wrapper around its vectorized C++ binary (optional)
+    if find_spec('fast_tsne') is not None:
+        return 'fitsne'
+    return 'sklearn'
+
+def compute_tsne(X, perplexity=30, seed=42, backend=None):
+    """
+    Project X to 2D with the fastest t-SNE implementation available.
+
+    Uses tsne-cuda (GPU) if installed, then the SIMD/FFT-accelerated FIt-SNE
+    CPU build (fast_tsne), and finally falls back to scikit-learn's TSNE.
+    """
+    backend = backend or tsne_backend()
+    if backend == 'tsnecuda':
+        from tsnecuda import TSNE as TSNECuda
+        print("Using tsne-cuda (GPU) implementation")
+        return TSNECuda(n_components=2, perplexity=perplexity, random_seed=seed).fit_transform(X)
+    if backend == 'fitsne':
+        from fast_tsne import fast_tsne
+        print("Using fast_tsne (FIt-SNE CPU) implementation")
+        return fast_tsne(np.ascontiguousarray(X, dtype=np.float64),
+                         map_dims=2, perplexity=perplexity, seed=seed)
+    return TSNE(n_components=2, random_state=seed, perplexity=perplexity).fit_transform(X)
+
+def disk_cache(name, params=()):
+    """
+    Cache a function's array result in cache/{vectors_key}_{name}_{params}.npy.
+
+    Functions returning a tuple of arrays are stored as a single .npz file.
+    Changing the vectors file or any of the params invalidates the cache, so
+    params must name everything that changes the result, including which
+    implementation or algorithm variant produces it.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            tag = '_'.join(str(part) for part in (vectors_key, name, *params))
+            npy_path = os.path.join(cache_dir, f'{tag}.npy')
+            npz_path = os.path.join(cache_dir, f'{tag}.npz')
+            if os.path.exists(npy_path):
+                print(f"Loaded cached {name} from {npy_path}")
+                return np.load(npy_path)
+            if os.path.exists(npz_path):
+                print(f"Loaded cached {name} from {npz_path}")
+                with np.load(npz_path) as data:
+                    return tuple(data[f'arr_{i}'] for i in range(len(data.files)))
+
+            result = func(*args, **kwargs)
+            os.makedirs(cache_dir, exist_ok=True)
+            if isinstance(result, tuple):
+                np.savez(npz_path, *result)
+            else:
+                np.save(npy_path, result)
+            return result
+        return wrapper
+    return decorator
+
+# One set of GPU resources (CUDA context and scratch memory), created once and
+# shared by every FAISS index in this script when a GPU build of FAISS is installed
+gpu_resources = None
+if hasattr(faiss, 'StandardGpuResources') and faiss.get_num_gpus() > 0:
+    gpu_resources = faiss.StandardGpuResources()
+
+def to_gpu(index):
+    """Move a FAISS index to GPU 0 with the shared resources (no-op without a GPU)."""
+    if gpu_resources is None:
+        return index
+    return faiss.index_cpu_to_gpu(gpu_resources, 0, index)
+
+def _tally_codes_numpy(codes, labels, k, n_categories):
+    """NumPy fallback for tally_codes() when Numba is not installed."""
+    counts = np.zeros((k, n_categories), dtype=np.int64)
+    valid = codes >= 0  # -1 marks missing values
+    np.add.at(counts, (labels[valid], codes[valid]), 1)
+    return counts
+
+if njit is not None:
+    @njit(cache=True)
+    def tally_codes(codes, labels, k, n_categories):
+        """Count how many rows of each category code fall in each cluster."""
+        counts = np.zeros((k, n_categories), dtype=np.int64)
+        # Serial on purpose: a parallel prange would race on counts[...] += 1
+        for i in range(codes.size):
+            if codes[i] >= 0:  # -1 marks missing values
+                counts[labels[i], codes[i]] += 1
+        return counts
+else:
+    tally_codes = _tally_codes_numpy
+
+def top_counts(counts, categories, n=None):
+    """Return {category: count} for the n most frequent categories (like value_counts().head(n))."""
+    order = np.argsort(-counts, kind='stable')
+    order = order[counts[order] > 0][:n]
+    return {categories[j]: int(counts[j]) for j in order}
+
+# Reduce the embeddings once with PCA. K-means runs on the top principal
+# components (cheaper distances, same coarse cluster structure), and the first
+# two components double as the 2D PCA visualization below
+n_components = min(50, *embeddings.shape)
+print(f"\nReducing dimensions with PCA ({n_components} components)...")
+
+@disk_cache('pca', (n_components, 42))
+def run_pca(X):
+    pca = PCA(n_components=n_components, random_state=42)
+    return pca.fit_transform(X).astype(np.float32), pca.explained_variance_ratio_
+
+embeddings_reduced, pca_explained_variance = run_pca(embeddings)
+embeddings_2d_pca = embeddings_reduced[:, :2]
+
+# Perform clustering on the PCA-reduced embeddings
+# FAISS runs the Lloyd iterations in C++ (BLAS GEMM for the distance step)
+print("\nPerforming K-means clustering (FAISS)...")
 n_clusters = 10
-kmeans = KMeans(n_clusters=n_clusters, random_state=42)
-cluster_labels = kmeans.fit_predict(embeddings)
+
+# Above this many CVEs, switch to the sharded two-stage K-means. The variant
+# is part of the cache key, since the two paths give (slightly) different clusters
+batch_kmeans_threshold = 100_000
+kmeans_variant = 'sharded' if len(embeddings_reduced) >= batch_kmeans_threshold else 'kmeans-parallel'
+
+@disk_cache('kmeans', (kmeans_variant, f'pca{n_components}', n_clusters, 20, 42))
+def run_kmeans(X):
+    if kmeans_variant == 'sharded':
+        print(f"Using batch-parallel K-means for {len(X)} CVEs")
+        centroids = batch_parallel_kmeans(X, n_clusters)
+        centroid_index = to_gpu(faiss.IndexFlatL2(X.shape[1]))
+        centroid_index.add(centroids)
+    else:
+        seed_centroids = kmeans_parallel_init(X, n_clusters)
+        kmeans = faiss.Kmeans(d=X.shape[1], k=n_clusters, niter=20, seed=42, verbose=False)
+        kmeans.index = to_gpu(kmeans.index)
+        kmeans.train(X, init_centroids=seed_centroids)
+        centroids, centroid_index = kmeans.centroids, kmeans.index
+    # Assign every CVE to its nearest centroid
+    _, nearest_centroid = centroid_index.search(X, 1)
+    return centroids, nearest_centroid.ravel()
+
+centroids, cluster_labels = run_kmeans(embeddings_reduced)
+
+# Number of CVEs in each cluster, counted in one O(N) pass
+cluster_sizes = np.bincount(cluster_labels, minlength=n_clusters)
 
 # Analyze cluster characteristics
 print(f"\nCluster Analysis (Total CVEs: {len(embeddings)}):")
 print("=" * 60)
 
+# Integer-encode each categorical column once, then tally all clusters in one pass
+cluster_counts = {}
+for column in ['CWE', 'Severity', 'Vendor', 'Impact']:
+    if column in metadata.columns:
+        codes, categories = pd.factorize(metadata[column])
+        counts = tally_codes(codes, cluster_labels, n_clusters, len(categories))
+        cluster_counts[column] = (counts, categories)
+
 for cluster_id in range(n_clusters):
-    cluster_mask = cluster_labels == cluster_id
-    cluster_metadata = metadata[cluster_mask]
-    
     print(f"Cluster {cluster_id}:")
-    print(f"  Size: {cluster_mask.sum()}")
+    print(f"  Size: {cluster_sizes[cluster_id]}")
     
     # Top CWEs in this cluster
-    if 'CWE' in cluster_metadata.columns:
-        top_cwes = cluster_metadata['CWE'].value_counts().head(3)
-        print(f"  Top CWEs: {top_cwes.to_dict()}")
+    if 'CWE' in cluster_counts:
+        counts, categories = cluster_counts['CWE']
+        print(f"  Top CWEs: {top_counts(counts[cluster_id], categories, 3)}")
     
     # Severity distribution
-    if 'Severity' in cluster_metadata.columns:
-        severity_dist = cluster_metadata['Severity'].value_counts()
-        print(f"  Severity distribution: {severity_dist.to_dict()}")
+    if 'Severity' in cluster_counts:
+        counts, categories = cluster_counts['Severity']
+        print(f"  Severity distribution: {top_counts(counts[cluster_id], categories)}")
     
     # Top vendors
-    if 'Vendor' in cluster_metadata.columns:
-        top_vendors = cluster_metadata['Vendor'].value_counts().head(2)
-        print(f"  Top vendors: {top_vendors.to_dict()}")
+    if 'Vendor' in cluster_counts:
+        counts, categories = cluster_counts['Vendor']
+        print(f"  Top vendors: {top_counts(counts[cluster_id], categories, 2)}")
     
     # Top impacts
-    if 'Impact' in cluster_metadata.columns:
-        top_impacts = cluster_metadata['Impact'].value_counts().head(2)
-        print(f"  Top impacts: {top_impacts.to_dict()}")
+    if 'Impact' in cluster_counts:
+        counts, categories = cluster_counts['Impact']
+        print(f"  Top impacts: {top_counts(counts[cluster_id], categories, 2)}")
     
     print()
 
+# Representative CVEs: the members closest to each centroid, found with one
+# batched exact k-NN search (BLAS GEMM) over a flat L2 index of the embeddings
+# (in the same PCA-reduced space as the centroids)
+n_representatives = 5
+index_file = os.path.join(cache_dir, f'{vectors_key}_pca{n_components}_flat_l2.faiss')
+if os.path.exists(index_file):
+    embedding_index = faiss.read_index(index_file)
+else:
+    embedding_index = faiss.IndexFlatL2(embeddings_reduced.shape[1])
+    embedding_index.add(embeddings_reduced)
+    os.makedirs(cache_dir, exist_ok=True)
+    faiss.write_index(embedding_index, index_file)
+
+if 'CVE_ID' in metadata.columns:
+    _, representative_ids = to_gpu(embedding_index).search(centroids, n_representatives)
+    print(f"Representative CVEs ({n_representatives} closest to each centroid):")
+    for cluster_id, ids in enumerate(representative_ids):
+        print(f"  Cluster {cluster_id}: {', '.join(metadata['CVE_ID'].iloc[ids])}")
+    print()
+
 print("Clustering analysis complete!")
 
 # Create visualizations
 print("\nCreating visualizations...")
 
-# 1. Reduce dimensionality for visualization
-print("Reducing dimensions with PCA...")
-pca = PCA(n_components=2, random_state=42)
-embeddings_2d_pca = pca.fit_transform(embeddings)
-
+# 1. Reduce dimensionality for visualization (the 2D PCA view was computed above)
 print("Reducing dimensions with t-SNE...")
-tsne = TSNE(n_components=2, random_state=42, perplexity=30)
-embeddings_2d_tsne = tsne.fit_transform(embeddings)
+
+# Each backend gives a different layout, so installing one invalidates the cache
+tsne_impl = tsne_backend()
+
+@disk_cache('tsne', (tsne_impl, 'p30', 42))
+def run_tsne(X):
+    return compute_tsne(X, perplexity=30, seed=42, backend=tsne_impl)
+
+embeddings_2d_tsne = run_tsne(embeddings)
 
 # Create a figure with multiple subplots
 fig = plt.figure(figsize=(20, 15))
 
 # 1. PCA Cluster Visualization
+# The point clouds are drawn with rasterized=True so they are composited as a
+# single image layer instead of one vector path per point
 ax1 = plt.subplot(2, 3, 1)
 scatter = plt.scatter(embeddings_2d_pca[:, 0], embeddings_2d_pca[:, 1], 
-                     c=cluster_labels, cmap='tab10', alpha=0.7, s=50)
+                     c=cluster_labels, cmap='tab10', alpha=0.7, s=50, rasterized=True)
 plt.title('CVE Clusters - PCA Visualization', fontsize=14, fontweight='bold')
 plt.xlabel('First Principal Component')
 plt.ylabel('Second Principal Component')
@@ -109,7 +399,7 @@ plt.grid(True, alpha=0.3)
 # 2. t-SNE Cluster Visualization
 ax2 = plt.subplot(2, 3, 2)
 scatter2 = plt.scatter(embeddings_2d_tsne[:, 0], embeddings_2d_tsne[:, 1], 
-                      c=cluster_labels, cmap='tab10', alpha=0.7, s=50)
+                      c=cluster_labels, cmap='tab10', alpha=0.7, s=50, rasterized=True)
 plt.title('CVE Clusters - t-SNE Visualization', fontsize=14, fontweight='bold')
 plt.xlabel('t-SNE Component 1')
 plt.ylabel('t-SNE Component 2')
@@ -118,8 +408,7 @@ plt.grid(True, alpha=0.3)
 
 # 3. Cluster Size Distribution
 ax3 = plt.subplot(2, 3, 3)
-cluster_sizes = pd.Series(cluster_labels).value_counts().sort_index()
-bars = plt.bar(cluster_sizes.index, cluster_sizes.values, color='skyblue', alpha=0.8)
+bars = plt.bar(range(n_clusters), cluster_sizes, color='skyblue', alpha=0.8)
 plt.title('Cluster Size Distribution', fontsize=14, fontweight='bold')
 plt.xlabel('Cluster ID')
 plt.ylabel('Number of CVEs')
@@ -132,8 +421,10 @@ for bar in bars:
 
 # 4. Severity Distribution by Cluster
 ax4 = plt.subplot(2, 3, 4)
-if 'Severity' in metadata.columns:
-    severity_cluster = pd.crosstab(metadata['Severity'], cluster_labels)
+if 'Severity' in cluster_counts:
+    # Reuse the (cluster, severity) tally from the cluster analysis instead of pd.crosstab
+    counts, categories = cluster_counts['Severity']
+    severity_cluster = pd.DataFrame(counts.T, index=categories, columns=range(n_clusters)).sort_index()
     severity_cluster.plot(kind='bar', stacked=True, ax=ax4, colormap='viridis')
     plt.title('Severity Distribution by Cluster', fontsize=14, fontweight='bold')
     plt.xlabel('Severity Level')
@@ -166,7 +457,9 @@ if 'Impact' in metadata.columns:
 
 plt.tight_layout()
 plt.savefig('cve_clustering_analysis.png', dpi=300, bbox_inches='tight')
-plt.show()
+if not headless:
+    plt.show()
+plt.close(fig)  # Free the figure's buffers before building the next one
 
 print("\nVisualization complete!")
 print("Saved comprehensive analysis as 'cve_clustering_analysis.png'")
@@ -177,8 +470,8 @@ if 'Severity' in metadata.columns:
     
     # Color by Severity
     severity_colors = {'Critical': 'red', 'High': 'orange', 'Medium': 'yellow', 'Low': 'green'}
-    colors = [severity_colors.get(sev, 'gray') for sev in metadata['Severity']]
-    ax1.scatter(embeddings_2d_tsne[:, 0], embeddings_2d_tsne[:, 1], c=colors, alpha=0.7, s=50)
+    colors = metadata['Severity'].map(severity_colors).fillna('gray').to_numpy()
+    ax1.scatter(embeddings_2d_tsne[:, 0], embeddings_2d_tsne[:, 1], c=colors, alpha=0.7, s=50, rasterized=True)
     ax1.set_title('CVE Embeddings Colored by Severity', fontsize=14, fontweight='bold')
     ax1.set_xlabel('t-SNE Component 1')
     ax1.set_ylabel('t-SNE Component 2')
@@ -194,8 +487,8 @@ if 'Severity' in metadata.columns:
     if 'Vendor' in metadata.columns:
         top_vendors = metadata['Vendor'].value_counts().head(5).index
         vendor_colors = dict(zip(top_vendors, sns.color_palette("Set1", len(top_vendors))))
-        colors = [vendor_colors.get(vendor, 'lightgray') for vendor in metadata['Vendor']]
-        ax2.scatter(embeddings_2d_tsne[:, 0], embeddings_2d_tsne[:, 1], c=colors, alpha=0.7, s=50)
+        colors = metadata['Vendor'].map(vendor_colors).fillna('lightgray').to_numpy()
+        ax2.scatter(embeddings_2d_tsne[:, 0], embeddings_2d_tsne[:, 1], c=colors, alpha=0.7, s=50, rasterized=True)
         ax2.set_title('CVE Embeddings Colored by Top Vendors', fontsize=14, fontweight='bold')
         ax2.set_xlabel('t-SNE Component 1')
         ax2.set_ylabel('t-SNE Component 2')
@@ -208,15 +501,15 @@ if 'Severity' in metadata.columns:
     
     # Cluster centers on t-SNE
     ax3.scatter(embeddings_2d_tsne[:, 0], embeddings_2d_tsne[:, 1], 
-               c=cluster_labels, cmap='tab10', alpha=0.5, s=30)
+               c=cluster_labels, cmap='tab10', alpha=0.5, s=30, rasterized=True)
     
     # Add cluster centers
-    cluster_centers_2d = []
-    for i in range(n_clusters):
-        cluster_points = embeddings_2d_tsne[cluster_labels == i]
-        center = cluster_points.mean(axis=0)
-        cluster_centers_2d.append(center)
-        ax3.scatter(center[0], center[1], c='red', s=200, marker='x', linewidths=3)
+    # Sum every point into its cluster in one pass, then divide by the cluster sizes
+    center_sums = np.zeros((n_clusters, 2))
+    np.add.at(center_sums, cluster_labels, embeddings_2d_tsne)
+    cluster_centers_2d = center_sums / cluster_sizes[:, None]
+    ax3.scatter(cluster_centers_2d[:, 0], cluster_centers_2d[:, 1], c='red', s=200, marker='x', linewidths=3)
+    for i, center in enumerate(cluster_centers_2d):
         ax3.annotate(f'C{i}', (center[0], center[1]), xytext=(5, 5), 
                     textcoords='offset points', fontweight='bold')
     
@@ -236,7 +529,9 @@ if 'Severity' in metadata.columns:
     
     plt.tight_layout()
     plt.savefig('cve_detailed_analysis.png', dpi=300, bbox_inches='tight')
-    plt.show()
+    if not headless:
+        plt.show()
+    plt.close(fig2)
     
     print("Saved detailed analysis as 'cve_detailed_analysis.png'")
 
@@ -246,9 +541,11 @@ print("="*60)
 print(f"Total CVEs analyzed: {len(embeddings)}")
 print(f"Embedding dimensions: {embeddings.shape[1]}")
 print(f"Number of clusters: {n_clusters}")
-print(f"PCA explained variance ratio: {pca.explained_variance_ratio_}")
-print(f"Total variance explained by 2D PCA: {pca.explained_variance_ratio_.sum():.3f}")
+print(f"PCA components used for K-means: {n_components}")
+print(f"PCA explained variance ratio: {pca_explained_variance[:2]}")
+print(f"Total variance explained by 2D PCA: {pca_explained_variance[:2].sum():.3f}")
 print("\nVisualization files created:")
 print("- cve_clustering_analysis.png (comprehensive overview)")
 print("- cve_detailed_analysis.png (detailed metadata analysis)")
-print("\nAll visualizations displayed above!")
\ No newline at end of file
+if not headless:
+    print("\nAll visualizations displayed above!")
\ No newline at end of file
@@ -54,13 +54,17 @@ workflow.add_conditional_edges(
 workflow.add_edge("exploitation", "generate_report")
 workflow.add_edge("generate_report", END)
 
-# 5. Compile
+# 5. Compile once at import time; importers (tests, notebooks) reuse this graph
 app = workflow.compile()
 
+__all__ = ["app"]
+
+
 # ------------------------------------------------------------------
 # 6. Run
 # ------------------------------------------------------------------
-if __name__ == "__main__":
+def main():
+    """Run the compiled graph against the example target and print the report."""
     initial_state = {
         "target_domain": "example.com",
         "is_exploitable": False,
@@ -83,3 +87,7 @@ if __name__ == "__main__":
     for entry in final_state.get("workflow_log", []):
         print(f"  • {entry}")
     print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+Shared pytest fixtures for the Shodan MCP server tests.
+
+The server module is imported, and the mock OpenAPI spec file read and parsed,
+once per test run rather than once per test.
+"""
+
+import copy
+import functools
+import json
+from pathlib import Path
+
+import pytest
+
+FIXTURES_DIR = Path(__file__).parent / "fixtures"
+
+@functools.lru_cache(maxsize=1)
+def load_mock_spec_bytes() -> bytes:
+    """Read the minimal Shodan OpenAPI spec fixture, once per process."""
+    return (FIXTURES_DIR / "shodan_openapi_min.json").read_bytes()
+
+@pytest.fixture(scope="session")
+def shodan_mod():
+    """The shodan_mcp module; tests using it are skipped if it can't be imported."""
+    return pytest.importorskip("shodan_mcp")
+
+@pytest.fixture(scope="class")
+def class_monkeypatch():
+    """
+    A MonkeyPatch shared by all tests in a class, undone after the last one.
+    Only the variables it touches are saved and restored, not the whole environment.
+    """
+    mp = pytest.MonkeyPatch()
+    yield mp
+    mp.undo()
+
+@pytest.fixture(scope="session")
+def parsed_mock_spec():
+    """The mock spec parsed once for the session. Tests should use mock_spec instead."""
+    return json.loads(load_mock_spec_bytes())
+
+@pytest.fixture
+def mock_spec(parsed_mock_spec):
+    """
+    A minimal Shodan OpenAPI specification. Each test gets its own deep copy,
+    so changes made by one test can't leak into the next.
+    """
+    return copy.deepcopy(parsed_mock_spec)
+
+@pytest.fixture(scope="session")
+def mock_spec_payload():
+    """The mock spec as an HTTP response body: the fixture file's bytes, served as-is."""
+    return load_mock_spec_bytes()
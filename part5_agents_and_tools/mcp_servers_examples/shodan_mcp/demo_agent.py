@@ -14,24 +14,33 @@ import asyncio
 import time
 
 async def simulate_agent_scenario(scenario_name, description, steps):
-    """Simulate running an agent scenario."""
-    print(f"\n{'='*60}")
-    print(f"📋 Scenario: {scenario_name}")
-    print(f"📝 Description: {description}")
-    print("="*60)
+    """
+    Simulate running an agent scenario.
+
+    The output is collected and returned instead of printed, so scenarios can
+    run concurrently without interleaving their output.
+    """
+    lines = [
+        f"\n{'='*60}",
+        f"📋 Scenario: {scenario_name}",
+        f"📝 Description: {description}",
+        "="*60,
+    ]
     
     for i, step in enumerate(steps, 1):
-        print(f"\n🔄 Step {i}: {step['action']}")
+        lines.append(f"\n🔄 Step {i}: {step['action']}")
         await asyncio.sleep(1)  # Simulate processing time
         
         if 'shodan_call' in step:
-            print(f"   🔍 Calling Shodan MCP: {step['shodan_call']}")
+            lines.append(f"   🔍 Calling Shodan MCP: {step['shodan_call']}")
             await asyncio.sleep(0.5)
         
-        print(f"   ✅ {step['result']}")
+        lines.append(f"   ✅ {step['result']}")
         
         if 'data' in step:
-            print(f"   📊 Sample Data: {step['data']}")
+            lines.append(f"   📊 Sample Data: {step['data']}")
+    
+    return "\n".join(lines)
 
 async def demo_infrastructure_reconnaissance():
     """Demo the infrastructure reconnaissance scenario."""
@@ -60,7 +69,7 @@ async def demo_infrastructure_reconnaissance():
         }
     ]
     
-    await simulate_agent_scenario(
+    return await simulate_agent_scenario(
         "Infrastructure Reconnaissance",
         "Perform reconnaissance on tesla.com domain",
         steps
@@ -93,7 +102,7 @@ async def demo_vulnerability_assessment():
         }
     ]
     
-    await simulate_agent_scenario(
+    return await simulate_agent_scenario(
         "Vulnerability Assessment",
         "Search for potentially vulnerable SSH services",
         steps
@@ -126,7 +135,7 @@ async def demo_iot_security_analysis():
         }
     ]
     
-    await simulate_agent_scenario(
+    return await simulate_agent_scenario(
         "IoT Security Analysis",
         "Analyze IoT device security posture",
         steps
@@ -160,7 +169,7 @@ async def demo_dns_intelligence():
         }
     ]
     
-    await simulate_agent_scenario(
+    return await simulate_agent_scenario(
         "DNS Intelligence Gathering",
         "Perform DNS-based reconnaissance techniques",
         steps
@@ -181,12 +190,14 @@ async def main():
         demo_dns_intelligence
     ]
     
-    for i, scenario in enumerate(scenarios, 1):
-        await scenario()
-        
-        if i < len(scenarios):
-            print(f"\n⏸️  Scenario {i} completed. Continuing to next scenario...")
-            await asyncio.sleep(2)
+    # The scenarios are independent, so run them concurrently and print the
+    # results in their original order
+    print(f"\n🎯 Running {len(scenarios)} scenarios concurrently...")
+    results = await asyncio.gather(*(scenario() for scenario in scenarios))
+    
+    for i, result in enumerate(results, 1):
+        print(result)
+        print(f"\n✅ Scenario {i} completed.")
     
     print(f"\n{'='*60}")
     print("🎉 All demo scenarios completed!")
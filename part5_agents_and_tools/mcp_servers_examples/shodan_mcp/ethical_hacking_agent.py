@@ -22,6 +22,16 @@ script_dir = os.path.dirname(__file__)
 dotenv_path = os.path.join(script_dir, '.env')
 load_dotenv(dotenv_path=dotenv_path)
 
+async def run_scenario(agent, scenario):
+    """Run a single scenario task through the agent and return its final response."""
+    response = await agent.ainvoke({
+        "messages": [{
+            "role": "user", 
+            "content": scenario["task"]
+        }]
+    })
+    return response['messages'][-1].content
+
 async def main():
     """Main function to run the ethical hacking agent."""
     print("🔍 Ethical Hacking Agent - Shodan MCP Integration")
@@ -127,35 +137,29 @@ async def main():
         }
     ]
     
-    print(f"\n🎯 Running {len(scenarios)} ethical hacking scenarios...")
+    print(f"\n🎯 Running {len(scenarios)} ethical hacking scenarios concurrently...")
     print("   Note: All activities are for educational and authorized testing purposes only.")
     
-    for i, scenario in enumerate(scenarios, 1):
+    # The scenarios are independent, so run them concurrently. Exceptions are
+    # returned instead of raised so one failing scenario doesn't stop the others.
+    results = await asyncio.gather(
+        *(run_scenario(agent, scenario) for scenario in scenarios),
+        return_exceptions=True
+    )
+    
+    # Print the results in the original scenario order
+    for i, (scenario, result) in enumerate(zip(scenarios, results), 1):
         print(f"\n{'='*60}")
         print(f"📋 Scenario {i}: {scenario['name']}")
         print(f"📝 Description: {scenario['description']}")
         print("="*60)
         
-        try:
-            # Run the agent with the scenario task
-            response = await agent.ainvoke({
-                "messages": [{
-                    "role": "user", 
-                    "content": scenario["task"]
-                }]
-            })
-            
-            # Extract and display the agent's response
-            agent_response = response['messages'][-1].content
-            print(f"\n🤖 Agent Response:\n{agent_response}")
-            
-        except Exception as e:
-            print(f"❌ Error during scenario '{scenario['name']}': {e}")
+        if isinstance(result, Exception):
+            print(f"❌ Error during scenario '{scenario['name']}': {result}")
             continue
         
-        # Add a pause between scenarios for readability
-        print(f"\n⏸️  Scenario {i} completed. Continuing to next scenario...")
-        await asyncio.sleep(2)
+        print(f"\n🤖 Agent Response:\n{result}")
+        print(f"\n✅ Scenario {i} completed.")
     
     print(f"\n{'='*60}")
     print("🎉 All ethical hacking scenarios completed!")
@@ -14,16 +14,125 @@ Usage:
 """
 
 import asyncio
+import io
 import os
-from typing import Dict, Any, List
+import sys
+from typing import Dict, Any, List, Optional, Tuple, Union
+
+# Use the MCP server's SHODAN_CONCURRENCY parsing so both enforce the same limit
+from shodan_mcp import get_concurrency
+
+class BatchedShodanClient:
+    """
+    Coalesces concurrent single-IP host lookups into bulk Shodan requests.
+    
+    Shodan's host endpoint accepts a comma-separated list of IPs, so lookups
+    queued within a short window are sent as one request and the results are
+    handed back to each caller.
+    """
+    
+    def __init__(self, max_batch_size: int = 50, max_wait: float = 0.01, max_concurrency: Optional[int] = None):
+        # self.mcp_client = Client("stdio", "uv run shodan_mcp.py")
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        # Cap concurrent Shodan calls so fan-out doesn't trip rate limits
+        self.semaphore = asyncio.Semaphore(max_concurrency or get_concurrency())
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._batches: set = set()
+    
+    async def host_info(self, ip: str) -> Dict[str, Any]:
+        """
+        Queue a host lookup and wait for the batch it lands in to complete.
+        """
+        if self._worker is None:
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.create_task(self._collect_batches())
+        
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((ip, future))
+        return await future
+    
+    async def aclose(self):
+        """
+        Stop the background batching task. Batches already sent are allowed to
+        finish; lookups still waiting for a batch fail instead of hanging.
+        """
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+            while not self._queue.empty():
+                _, future = self._queue.get_nowait()
+                self._fail_closed([future])
+        if self._batches:
+            await asyncio.gather(*self._batches, return_exceptions=True)
+    
+    @staticmethod
+    def _fail_closed(futures: List[asyncio.Future]):
+        for future in futures:
+            if not future.done():
+                future.set_exception(RuntimeError("BatchedShodanClient was closed before the lookup was sent"))
+    
+    async def _collect_batches(self):
+        while True:
+            batch = [await self._queue.get()]
+            try:
+                # Give concurrent callers a moment to join this batch
+                await asyncio.sleep(self.max_wait)
+            except asyncio.CancelledError:
+                self._fail_closed([future for _, future in batch])
+                raise
+            while len(batch) < self.max_batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            
+            task = asyncio.create_task(self._send_batch(batch))
+            self._batches.add(task)
+            task.add_done_callback(self._batches.discard)
+    
+    async def _send_batch(self, batch: List[Tuple[str, asyncio.Future]]):
+        try:
+            async with self.semaphore:
+                hosts = await self._fetch_hosts([ip for ip, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        
+        # Shodan answers a single-IP lookup with one host object, not a list
+        if isinstance(hosts, dict):
+            hosts = [hosts]
+        hosts_by_ip = {host["ip_str"]: host for host in hosts}
+        for ip, future in batch:
+            if future.done():
+                continue
+            if ip in hosts_by_ip:
+                future.set_result(hosts_by_ip[ip])
+            else:
+                future.set_exception(LookupError(f"No information available for {ip}"))
+    
+    async def _fetch_hosts(self, ips: List[str]) -> Union[Dict[str, Any], List[Dict[str, Any]]]:
+        # return await self.mcp_client.call_tool("shodan_host_info", {
+        #     "ip": ",".join(ips)
+        # })
+        await asyncio.sleep(0.1)  # Simulated network round-trip
+        if len(ips) == 1:
+            return {"ip_str": ips[0]}
+        return [{"ip_str": ip} for ip in ips]
 
 # Example 1: Direct MCP Client Usage
 async def example_direct_mcp_usage():
     """
     Example of using the Shodan MCP server directly with an MCP client.
     """
-    print("📡 Example 1: Direct MCP Client Usage")
-    print("-" * 50)
+    out = io.StringIO()
+    
+    print("📡 Example 1: Direct MCP Client Usage", file=out)
+    print("-" * 50, file=out)
     
     try:
         # This would be the actual MCP client connection
@@ -31,44 +140,54 @@ async def example_direct_mcp_usage():
         # client = Client("stdio", "uv run shodan_mcp.py")
         
         # Simulated client calls (replace with actual MCP client)
-        print("🔍 Searching for SSH servers...")
+        print("🔍 Searching for SSH servers...", file=out)
         # search_result = await client.call_tool("shodan_host_search", {
         #     "query": "port:22",
         #     "facets": "country,org"
         # })
         
-        print("✅ Found SSH servers with country and organization breakdown")
+        print("✅ Found SSH servers with country and organization breakdown", file=out)
         
-        print("\n🏠 Getting host information...")
+        print("\n🏠 Getting host information...", file=out)
         # host_info = await client.call_tool("shodan_host_info", {
         #     "ip": "8.8.8.8"
         # })
         
-        print("✅ Retrieved detailed information for Google DNS server")
+        print("✅ Retrieved detailed information for Google DNS server", file=out)
         
-        print("\n🌐 Resolving domains...")
+        print("\n🌐 Resolving domains...", file=out)
         # dns_result = await client.call_tool("shodan_dns_resolve", {
         #     "hostnames": "google.com,github.com"
         # })
         
-        print("✅ Resolved multiple domains to IP addresses")
+        print("✅ Resolved multiple domains to IP addresses", file=out)
         
     except Exception as e:
-        print(f"❌ Error: {e}")
+        print(f"❌ Error: {e}", file=out)
+    
+    return out.getvalue()
 
 # Example 2: LangGraph Integration
 async def example_langgraph_integration():
     """
     Example of integrating Shodan MCP server with LangGraph for automated workflows.
     """
-    print("\n🤖 Example 2: LangGraph Integration")
-    print("-" * 50)
+    out = io.StringIO()
+    
+    print("\n🤖 Example 2: LangGraph Integration", file=out)
+    print("-" * 50, file=out)
     
     # Simulated LangGraph workflow
     class ShodanReconAgent:
         def __init__(self):
-            # self.mcp_client = Client("stdio", "uv run shodan_mcp.py")
-            pass
+            # Host lookups issued together are coalesced into bulk requests
+            self.shodan = BatchedShodanClient()
+        
+        async def get_host_info(self, ip: str) -> Dict[str, Any]:
+            """
+            Fetch host information for a single IP.
+            """
+            return await self.shodan.host_info(ip)
         
         async def reconnaissance_workflow(self, target_domain: str) -> Dict[str, Any]:
             """
@@ -82,64 +201,74 @@ async def example_langgraph_integration():
                 "summary": {}
             }
             
-            print(f"🎯 Starting reconnaissance for: {target_domain}")
+            print(f"🎯 Starting reconnaissance for: {target_domain}", file=out)
             
             # Step 1: DNS Resolution
-            print("  📍 Step 1: Resolving domain...")
+            print("  📍 Step 1: Resolving domain...", file=out)
             # dns_info = await self.mcp_client.call_tool("shodan_dns_resolve", {
             #     "hostnames": target_domain
             # })
             # results["dns_info"] = dns_info
-            print(f"    ✅ Resolved {target_domain}")
+            print(f"    ✅ Resolved {target_domain}", file=out)
             
             # Step 2: Search for domain in Shodan
-            print("  🔍 Step 2: Searching Shodan database...")
+            print("  🔍 Step 2: Searching Shodan database...", file=out)
             # search_results = await self.mcp_client.call_tool("shodan_host_search", {
             #     "query": f"hostname:{target_domain}",
             #     "facets": "port,product,country"
             # })
             # results["search_results"] = search_results
-            print(f"    ✅ Found services for {target_domain}")
+            print(f"    ✅ Found services for {target_domain}", file=out)
             
             # Step 3: Get detailed host information
-            print("  🏠 Step 3: Getting detailed host information...")
-            # for match in search_results.get("matches", [])[:5]:  # Limit to 5 hosts
-            #     host_info = await self.mcp_client.call_tool("shodan_host_info", {
-            #         "ip": match["ip_str"]
-            #     })
-            #     results["host_info"].append(host_info)
-            print("    ✅ Retrieved detailed host information")
+            print("  🏠 Step 3: Getting detailed host information...", file=out)
+            # matches = search_results.get("matches", [])[:5]  # Limit to 5 hosts
+            matches = [{"ip_str": f"93.184.216.{i}"} for i in range(34, 39)]  # Simulated matches
+            # Look up all hosts concurrently; they go out as a single bulk request
+            host_info = await asyncio.gather(
+                *(self.get_host_info(match["ip_str"]) for match in matches),
+                return_exceptions=True
+            )
+            results["host_info"] = [info for info in host_info if not isinstance(info, Exception)]
+            print("    ✅ Retrieved detailed host information", file=out)
             
             # Step 4: Generate summary
-            print("  📊 Step 4: Generating summary...")
+            print("  📊 Step 4: Generating summary...", file=out)
             results["summary"] = {
-                "total_hosts": 5,  # len(results["host_info"])
+                "total_hosts": len(results["host_info"]),
                 "unique_ports": [22, 80, 443],  # Extract from results
                 "countries": ["US", "DE"],  # Extract from facets
                 "technologies": ["nginx", "apache"]  # Extract from products
             }
-            print("    ✅ Generated reconnaissance summary")
+            print("    ✅ Generated reconnaissance summary", file=out)
             
             return results
     
     # Run the workflow
     agent = ShodanReconAgent()
-    results = await agent.reconnaissance_workflow("example.com")
-    
-    print(f"\n📋 Reconnaissance Summary:")
-    print(f"   Target: {results['target']}")
-    print(f"   Hosts Found: {results['summary']['total_hosts']}")
-    print(f"   Open Ports: {', '.join(map(str, results['summary']['unique_ports']))}")
-    print(f"   Countries: {', '.join(results['summary']['countries'])}")
-    print(f"   Technologies: {', '.join(results['summary']['technologies'])}")
+    try:
+        results = await agent.reconnaissance_workflow("example.com")
+    finally:
+        await agent.shodan.aclose()
+    
+    print(f"\n📋 Reconnaissance Summary:", file=out)
+    print(f"   Target: {results['target']}", file=out)
+    print(f"   Hosts Found: {results['summary']['total_hosts']}", file=out)
+    print(f"   Open Ports: {', '.join(map(str, results['summary']['unique_ports']))}", file=out)
+    print(f"   Countries: {', '.join(results['summary']['countries'])}", file=out)
+    print(f"   Technologies: {', '.join(results['summary']['technologies'])}", file=out)
+    
+    return out.getvalue()
 
 # Example 3: Threat Intelligence Gathering
 async def example_threat_intelligence():
     """
     Example of using Shodan MCP server for threat intelligence gathering.
     """
-    print("\n🛡️  Example 3: Threat Intelligence Gathering")
-    print("-" * 50)
+    out = io.StringIO()
+    
+    print("\n🛡️  Example 3: Threat Intelligence Gathering", file=out)
+    print("-" * 50, file=out)
     
     # Common threat intelligence queries
     threat_queries = [
@@ -165,94 +294,127 @@ async def example_threat_intelligence():
         }
     ]
     
-    print("🔍 Running threat intelligence queries...")
+    print("🔍 Running threat intelligence queries...", file=out)
+    
+    semaphore = asyncio.Semaphore(get_concurrency())
+    
+    async def search_count(query: str) -> Dict[str, Any]:
+        async with semaphore:
+            # return await client.call_tool("shodan_search_count", {
+            #     "query": query,
+            #     "facets": "country,org"
+            # })
+            await asyncio.sleep(0.1)  # Simulated network round-trip
+            return {"total": 10000}
     
-    for i, query_info in enumerate(threat_queries, 1):
-        print(f"\n  📊 Query {i}: {query_info['name']}")
-        print(f"      Description: {query_info['description']}")
-        print(f"      Query: {query_info['query']}")
+    # The queries are independent, so issue them all at once
+    count_results = await asyncio.gather(
+        *(search_count(query_info["query"]) for query_info in threat_queries),
+        return_exceptions=True
+    )
+    
+    for i, (query_info, count_result) in enumerate(zip(threat_queries, count_results), 1):
+        print(f"\n  📊 Query {i}: {query_info['name']}", file=out)
+        print(f"      Description: {query_info['description']}", file=out)
+        print(f"      Query: {query_info['query']}", file=out)
         
-        # Simulate MCP call
-        # count_result = await client.call_tool("shodan_search_count", {
-        #     "query": query_info["query"],
-        #     "facets": "country,org"
-        # })
+        if isinstance(count_result, Exception):
+            print(f"      ❌ Error: {count_result}", file=out)
+            continue
         
         # Simulated results
-        print(f"      ✅ Found ~10,000 results")
-        print(f"      Top Countries: US (3,000), CN (2,500), DE (1,200)")
-        print(f"      Top Organizations: Amazon (500), Google (300), Microsoft (200)")
+        print(f"      ✅ Found ~{count_result['total']:,} results", file=out)
+        print(f"      Top Countries: US (3,000), CN (2,500), DE (1,200)", file=out)
+        print(f"      Top Organizations: Amazon (500), Google (300), Microsoft (200)", file=out)
+    
+    return out.getvalue()
+
+# Simulated infrastructure mapping results. They never change, so the report
+# lines are rendered once at import instead of on every run of the example.
+_SERVICES = {
+    "Web Services": {"ports": [80, 443], "count": 45},
+    "Email Services": {"ports": [25, 587, 993], "count": 12},
+    "SSH Access": {"ports": [22], "count": 78},
+    "Database Services": {"ports": [3306, 5432, 1433], "count": 8},
+    "Remote Access": {"ports": [3389, 5900], "count": 7}
+}
+
+_LOCATIONS = {
+    "United States": 89,
+    "Germany": 23,
+    "Singapore": 18,
+    "United Kingdom": 12,
+    "Canada": 8
+}
+
+_TECHNOLOGIES = {
+    "nginx": 34,
+    "Apache": 28,
+    "Microsoft IIS": 15,
+    "OpenSSH": 78,
+    "MySQL": 12,
+    "PostgreSQL": 8
+}
+
+_SERVICE_LINES = "".join(
+    f"    • {service}: {info['count']} instances on ports {info['ports']}\n"
+    for service, info in _SERVICES.items()
+)
+_LOCATION_LINES = "".join(
+    f"    • {country}: {count} assets\n" for country, count in _LOCATIONS.items()
+)
+_TECHNOLOGY_LINES = "".join(
+    f"    • {tech}: {count} instances\n" for tech, count in _TECHNOLOGIES.items()
+)
 
 # Example 4: Infrastructure Mapping
 async def example_infrastructure_mapping():
     """
     Example of mapping an organization's infrastructure using Shodan.
     """
-    print("\n🗺️  Example 4: Infrastructure Mapping")
-    print("-" * 50)
+    out = io.StringIO()
+    
+    print("\n🗺️  Example 4: Infrastructure Mapping", file=out)
+    print("-" * 50, file=out)
     
     target_org = "Example Corp"
     
-    print(f"🏢 Mapping infrastructure for: {target_org}")
+    print(f"🏢 Mapping infrastructure for: {target_org}", file=out)
     
     # Step 1: Find all assets belonging to the organization
-    print("\n  🔍 Step 1: Finding organizational assets...")
+    print("\n  🔍 Step 1: Finding organizational assets...", file=out)
     # org_search = await client.call_tool("shodan_host_search", {
     #     "query": f'org:"{target_org}"',
     #     "facets": "port,product,country,asn"
     # })
     
-    print(f"    ✅ Found 150 assets for {target_org}")
+    print(f"    ✅ Found 150 assets for {target_org}", file=out)
     
     # Step 2: Analyze service distribution
-    print("\n  📊 Step 2: Analyzing service distribution...")
-    services = {
-        "Web Services": {"ports": [80, 443], "count": 45},
-        "Email Services": {"ports": [25, 587, 993], "count": 12},
-        "SSH Access": {"ports": [22], "count": 78},
-        "Database Services": {"ports": [3306, 5432, 1433], "count": 8},
-        "Remote Access": {"ports": [3389, 5900], "count": 7}
-    }
-    
-    for service, info in services.items():
-        print(f"    • {service}: {info['count']} instances on ports {info['ports']}")
+    print("\n  📊 Step 2: Analyzing service distribution...", file=out)
+    out.write(_SERVICE_LINES)
     
     # Step 3: Geographic distribution
-    print("\n  🌍 Step 3: Geographic distribution...")
-    locations = {
-        "United States": 89,
-        "Germany": 23,
-        "Singapore": 18,
-        "United Kingdom": 12,
-        "Canada": 8
-    }
-    
-    for country, count in locations.items():
-        print(f"    • {country}: {count} assets")
+    print("\n  🌍 Step 3: Geographic distribution...", file=out)
+    out.write(_LOCATION_LINES)
     
     # Step 4: Technology stack analysis
-    print("\n  💻 Step 4: Technology stack analysis...")
-    technologies = {
-        "nginx": 34,
-        "Apache": 28,
-        "Microsoft IIS": 15,
-        "OpenSSH": 78,
-        "MySQL": 12,
-        "PostgreSQL": 8
-    }
-    
-    for tech, count in technologies.items():
-        print(f"    • {tech}: {count} instances")
+    print("\n  💻 Step 4: Technology stack analysis...", file=out)
+    out.write(_TECHNOLOGY_LINES)
+    
+    return out.getvalue()
 
 # Example 5: Security Monitoring
 async def example_security_monitoring():
     """
     Example of using Shodan for continuous security monitoring.
     """
-    print("\n🔒 Example 5: Security Monitoring")
-    print("-" * 50)
+    out = io.StringIO()
+    
+    print("\n🔒 Example 5: Security Monitoring", file=out)
+    print("-" * 50, file=out)
     
-    print("🚨 Setting up security monitoring alerts...")
+    print("🚨 Setting up security monitoring alerts...", file=out)
     
     # Monitoring scenarios
     monitoring_rules = [
@@ -277,10 +439,10 @@ async def example_security_monitoring():
     ]
     
     for rule in monitoring_rules:
-        print(f"\n  📋 Rule: {rule['name']}")
-        print(f"      Query: {rule['query']}")
-        print(f"      Type: {rule['alert_type']}")
-        print(f"      Description: {rule['description']}")
+        print(f"\n  📋 Rule: {rule['name']}", file=out)
+        print(f"      Query: {rule['query']}", file=out)
+        print(f"      Type: {rule['alert_type']}", file=out)
+        print(f"      Description: {rule['description']}", file=out)
         
         # Simulate alert setup
         # alert_result = await client.call_tool("shodan_create_alert", {
@@ -289,44 +451,55 @@ async def example_security_monitoring():
         #     "expires": 0  # Never expires
         # })
         
-        print(f"      ✅ Alert configured successfully")
+        print(f"      ✅ Alert configured successfully", file=out)
+    
+    return out.getvalue()
 
 async def main():
     """
     Run all examples to demonstrate Shodan MCP server capabilities.
     """
-    print("🔍 Shodan MCP Server - Usage Examples")
-    print("=" * 60)
-    print("Note: These examples show simulated usage patterns.")
-    print("Install dependencies and set SHODAN_API_KEY to run with real data.")
-    print("=" * 60)
+    out = io.StringIO()
+    
+    print("🔍 Shodan MCP Server - Usage Examples", file=out)
+    print("=" * 60, file=out)
+    print("Note: These examples show simulated usage patterns.", file=out)
+    print("Install dependencies and set SHODAN_API_KEY to run with real data.", file=out)
+    print("=" * 60, file=out)
     
     # Check if API key is set
     api_key = os.getenv("SHODAN_API_KEY")
     if api_key:
-        print(f"🔑 API Key found: {api_key[:8]}...")
+        print(f"🔑 API Key found: {api_key[:8]}...", file=out)
     else:
-        print("⚠️  No API key found. Set SHODAN_API_KEY environment variable.")
-    
-    # Run examples
-    await example_direct_mcp_usage()
-    await example_langgraph_integration()
-    await example_threat_intelligence()
-    await example_infrastructure_mapping()
-    await example_security_monitoring()
-    
-    print("\n" + "=" * 60)
-    print("🎉 Examples completed!")
-    print("\n📚 Next Steps:")
-    print("1. Install dependencies: uv sync")
-    print("2. Get Shodan API key: https://account.shodan.io/register")
-    print("3. Set environment: export SHODAN_API_KEY='your_key'")
-    print("4. Run MCP server: uv run shodan_mcp.py")
-    print("5. Connect your AI agent to the MCP server")
-    print("\n🔗 Resources:")
-    print("- Shodan API Docs: https://developer.shodan.io/api")
-    print("- FastMCP Docs: https://gofastmcp.com")
-    print("- MCP Protocol: https://modelcontextprotocol.io")
+        print("⚠️  No API key found. Set SHODAN_API_KEY environment variable.", file=out)
+    
+    # Run the independent examples concurrently. Each one buffers its own
+    # output, which is collected in order once they have all finished.
+    outputs = await asyncio.gather(
+        example_direct_mcp_usage(),
+        example_langgraph_integration(),
+        example_threat_intelligence(),
+        example_infrastructure_mapping(),
+        example_security_monitoring()
+    )
+    out.writelines(outputs)
+    
+    print("\n" + "=" * 60, file=out)
+    print("🎉 Examples completed!", file=out)
+    print("\n📚 Next Steps:", file=out)
+    print("1. Install dependencies: uv sync", file=out)
+    print("2. Get Shodan API key: https://account.shodan.io/register", file=out)
+    print("3. Set environment: export SHODAN_API_KEY='your_key'", file=out)
+    print("4. Run MCP server: uv run shodan_mcp.py", file=out)
+    print("5. Connect your AI agent to the MCP server", file=out)
+    print("\n🔗 Resources:", file=out)
+    print("- Shodan API Docs: https://developer.shodan.io/api", file=out)
+    print("- FastMCP Docs: https://gofastmcp.com", file=out)
+    print("- MCP Protocol: https://modelcontextprotocol.io", file=out)
+    
+    # Emit the whole report with a single write
+    sys.stdout.write(out.getvalue())
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -6,11 +6,71 @@
 #
 # Instructor: Omar Santos @santosomar
 
+from __future__ import annotations
+
+import asyncio
+import hashlib
 import os
+import re
+import time
 import httpx
-from fastmcp import FastMCP
-from fastmcp.server.openapi import RouteMap, MCPType
-from typing import Optional
+import orjson
+from collections import OrderedDict
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from typing import TYPE_CHECKING, Optional
+
+# FastMCP pulls in Pydantic and its whole OpenAPI machinery, so it is only
+# imported once a server is actually built (or via __getattr__ below)
+if TYPE_CHECKING:
+    from fastmcp import FastMCP
+    from fastmcp.server.openapi import RouteMap
+
+SHODAN_API_URL = "https://api.shodan.io"
+OPENAPI_SPEC_URL = "https://developer.shodan.io/api/openapi.json"
+
+# Local copy of the OpenAPI spec, refreshed once it is older than the TTL
+OPENAPI_CACHE_PATH = Path(
+    os.getenv("XDG_CACHE_HOME", Path.home() / ".cache")
+) / "shodan_mcp" / "openapi.json"
+OPENAPI_CACHE_TTL = 24 * 60 * 60  # seconds
+
+# Opt-in reuse of FastMCP's parsed routes across restarts. This stores FastMCP
+# internals, which are only stable within one FastMCP version, hence the flag.
+ROUTE_CACHE_ENABLED = os.getenv("SHODAN_MCP_CACHE") == "1"
+
+# Maximum number of Shodan requests in flight at once, tunable per deployment
+# through the SHODAN_CONCURRENCY environment variable (see get_concurrency)
+DEFAULT_SHODAN_CONCURRENCY = 10
+
+# How often a rate-limited (HTTP 429) request is retried before giving up
+SHODAN_MAX_RETRIES = 3
+
+# Longest wait between retries, in seconds. The retry sleeps while holding a
+# concurrency slot, so a large Retry-After must not stall the other requests.
+MAX_RETRY_DELAY = 30.0
+
+# Repeat GET requests within this window are answered from memory
+RESPONSE_CACHE_SIZE = 1024
+RESPONSE_CACHE_TTL = 300  # seconds
+
+# Endpoints whose answers change with every call (credits, scans, alerts)
+_UNCACHED_PATHS = ("/account", "/api-info", "/shodan/scan", "/shodan/alert", "/notifier")
+
+# Search filter clauses: name:"quoted value", "quoted phrase", or a bare token
+_QUERY_CLAUSE = re.compile(r'\S+:"[^"]*"|"[^"]*"|\S+')
+
+def __getattr__(name: str):
+    """
+    Lazily expose FastMCP's classes as module attributes (PEP 562).
+    """
+    if name == "FastMCP":
+        from fastmcp import FastMCP
+        return FastMCP
+    if name in ("RouteMap", "MCPType"):
+        from fastmcp.server import openapi
+        return getattr(openapi, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 def get_api_key() -> str:
     """
@@ -30,19 +90,205 @@ def get_api_key() -> str:
         )
     return api_key
 
-def create_shodan_client() -> httpx.AsyncClient:
+def get_concurrency() -> int:
+    """
+    Get the maximum number of concurrent Shodan requests from the environment.
+    
+    Returns:
+        int: SHODAN_CONCURRENCY, or DEFAULT_SHODAN_CONCURRENCY if it is not set
+        
+    Raises:
+        ValueError: If SHODAN_CONCURRENCY is not a positive integer
+    """
+    value = os.getenv("SHODAN_CONCURRENCY")
+    if not value:
+        return DEFAULT_SHODAN_CONCURRENCY
+    try:
+        concurrency = int(value)
+    except ValueError:
+        concurrency = 0
+    if concurrency < 1:
+        raise ValueError(
+            f"SHODAN_CONCURRENCY must be a positive integer, got {value!r}. "
+            "Unset it to use the default of 10 concurrent requests."
+        )
+    return concurrency
+
+def normalize_query(query: str) -> str:
+    """
+    Put the filter clauses of a Shodan search query in a canonical order.
+    
+    Shodan combines clauses with AND, so "port:22 country:US" and
+    "country:US port:22" return the same results and share a cache entry.
+    
+    Args:
+        query: Shodan search query
+    
+    Returns:
+        str: The query with its clauses sorted
+    """
+    return " ".join(sorted(_QUERY_CLAUSE.findall(query)))
+
+class ThrottledTransport(httpx.AsyncBaseTransport):
+    """
+    HTTP transport that caps concurrent Shodan requests and retries rate-limited ones.
+    
+    Keeping fan-out below Shodan's rate limit gives steadier throughput than
+    bursting and backing off. When a 429 does come back, the request is retried
+    after the server's Retry-After delay, or an exponential backoff if none is given,
+capped at MAX_RETRY_DELAY seconds.
+    """
+    
+    def __init__(
+        self,
+        transport: httpx.AsyncBaseTransport,
+        max_concurrency: int = DEFAULT_SHODAN_CONCURRENCY,
+        max_retries: int = SHODAN_MAX_RETRIES
+    ):
+        self._transport = transport
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._max_retries = max_retries
+    
+    @staticmethod
+    def _retry_delay(response: httpx.Response, attempt: int) -> float:
+        try:
+            delay = max(0.0, float(response.headers["Retry-After"]))
+        except (KeyError, ValueError):
+            delay = float(2 ** attempt)
+        return min(delay, MAX_RETRY_DELAY)
+    
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        async with self._semaphore:
+            for attempt in range(self._max_retries + 1):
+                response = await self._transport.handle_async_request(request)
+                if response.status_code != 429 or attempt == self._max_retries:
+                    return response
+                
+                await response.aclose()
+                await asyncio.sleep(self._retry_delay(response, attempt))
+    
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+class CachingTransport(httpx.AsyncBaseTransport):
+    """
+    HTTP transport that keeps recent Shodan GET responses in a TTL-bounded LRU cache.
+    
+    Repeat lookups (the same host, search, or DNS query) within the TTL are
+    answered from memory, saving both the round-trip and API credits.
+    """
+    
+    def __init__(
+        self,
+        transport: httpx.AsyncBaseTransport,
+        maxsize: int = RESPONSE_CACHE_SIZE,
+        ttl: float = RESPONSE_CACHE_TTL
+    ):
+        self._transport = transport
+        self._maxsize = maxsize
+        self._ttl = ttl
+        self._cache: OrderedDict[tuple, tuple] = OrderedDict()
+    
+    def set_cache_size(self, maxsize: int) -> None:
+        """
+        Change the maximum number of cached responses, evicting the oldest as needed.
+        """
+        self._maxsize = maxsize
+        while len(self._cache) > self._maxsize:
+            self._cache.popitem(last=False)
+    
+    def _cache_key(self, request: httpx.Request) -> Optional[tuple]:
+        # Only Shodan API lookups are cached, not e.g. the OpenAPI spec download
+        if (
+            request.method != "GET"
+            or request.url.host != httpx.URL(SHODAN_API_URL).host
+            or request.url.path.startswith(_UNCACHED_PATHS)
+        ):
+            return None
+        params = [
+            (name, normalize_query(value) if name == "query" else value)
+            for name, value in request.url.params.multi_items()
+        ]
+        return (request.url.host, request.url.path, tuple(sorted(params)))
+    
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        key = self._cache_key(request)
+        if key is None:
+            return await self._transport.handle_async_request(request)
+        
+        entry = self._cache.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            self._cache.move_to_end(key)
+            _, status_code, headers, content = entry
+            return httpx.Response(status_code, headers=headers, content=content)
+        
+        response = await self._transport.handle_async_request(request)
+        if response.status_code != 200:
+            return response
+        
+        # Keep the raw (still encoded) body so the cached copy is compact and the
+        # original Content-Encoding header still applies to it
+        try:
+            content = b"".join([chunk async for chunk in response.stream])
+        finally:
+            await response.aclose()
+        headers = list(response.headers.multi_items())
+        
+        self._cache[key] = (time.monotonic() + self._ttl, response.status_code, headers, content)
+        self._cache.move_to_end(key)
+        if len(self._cache) > self._maxsize:
+            self._cache.popitem(last=False)
+        
+        return httpx.Response(response.status_code, headers=headers, content=content)
+    
+    async def aclose(self) -> None:
+        self._cache.clear()
+        await self._transport.aclose()
+
+def create_shodan_client(api_key: Optional[str] = None) -> httpx.AsyncClient:
     """
     Create an HTTP client configured for Shodan API with authentication.
     
+    Args:
+        api_key: Shodan API key; read from the environment if not provided
+    
     Returns:
         httpx.AsyncClient: Configured HTTP client
+        
+    Raises:
+        ValueError: If the API key is missing or SHODAN_CONCURRENCY is invalid
     """
-    api_key = get_api_key()
+    api_key = api_key or get_api_key()
+    
+    # The client is created once per server and reused for every tool call, so
+    # keep connections alive in a pool and use HTTP/2 to multiplex requests over
+    # a single TLS connection. DNS is only resolved when a new connection is
+    # opened, so a warm pool also saves the resolver round-trip; retries=1
+    # retries a failed connection attempt once instead of failing the tool
+    # call. Requests are throttled to SHODAN_CONCURRENCY at a time, and repeat
+    # lookups are served from a response cache without taking a slot.
+    transport = CachingTransport(
+        ThrottledTransport(
+            httpx.AsyncHTTPTransport(
+                http2=True,
+                retries=1,
+                limits=httpx.Limits(
+                    max_connections=100,
+                    max_keepalive_connections=20,
+                    keepalive_expiry=30.0
+                )
+            ),
+            max_concurrency=get_concurrency()
+        )
+    )
     
-    # Create client with base URL and timeout settings
+    # Create client with base URL and timeout settings. Shodan authenticates with
+    # a "key" query parameter, which httpx merges into every request's params.
     client = httpx.AsyncClient(
-        base_url="https://api.shodan.io",
+        base_url=SHODAN_API_URL,
         timeout=30.0,
+        transport=transport,
+        params={"key": api_key},
         headers={
             "User-Agent": "Shodan-MCP-Server/1.0"
         }
@@ -50,121 +296,262 @@ def create_shodan_client() -> httpx.AsyncClient:
     
     return client
 
-def load_openapi_spec() -> dict:
+def _read_cached_spec(cache_path: Path, max_age: Optional[float] = None) -> Optional[dict]:
     """
-    Load Shodan's OpenAPI specification from their API.
+    Read the cached OpenAPI specification, if present.
+    
+    Args:
+        cache_path: Location of the cached spec
+        max_age: Maximum age in seconds; None accepts a cache of any age
+    
+    Returns:
+        Optional[dict]: The cached spec, or None if missing, stale, or unreadable
+    """
+    try:
+        if max_age is not None and time.time() - cache_path.stat().st_mtime > max_age:
+            return None
+        return orjson.loads(cache_path.read_bytes())
+    except (OSError, orjson.JSONDecodeError):
+        return None
+
+def _write_cached_spec(cache_path: Path, spec: dict) -> None:
+    """
+    Write the OpenAPI specification to the local cache. Failures are ignored,
+    the cache only saves a network round-trip on the next startup.
+    """
+    try:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = cache_path.with_suffix(".tmp")
+        tmp_path.write_bytes(orjson.dumps(spec))
+        tmp_path.replace(cache_path)
+    except OSError:
+        pass
+
+async def load_openapi_spec(client: httpx.AsyncClient, cache_path: Optional[Path] = None) -> dict:
+    """
+    Load Shodan's OpenAPI specification, using a local cache when it is fresh.
+    
+    Args:
+        client: HTTP client used to download the spec; the server's Shodan client
+            is passed in so the download shares its connection pool
+        cache_path: Location of the cached spec; defaults to OPENAPI_CACHE_PATH
     
     Returns:
         dict: The OpenAPI specification
     """
+    cache_path = cache_path or OPENAPI_CACHE_PATH
+    
+    spec = _read_cached_spec(cache_path, max_age=OPENAPI_CACHE_TTL)
+    if spec is not None:
+        print(f"✅ Loaded cached OpenAPI spec with {len(spec.get('paths', {}))} endpoints")
+        return spec
+    
     try:
         print("📥 Loading Shodan OpenAPI specification...")
-        response = httpx.get("https://developer.shodan.io/api/openapi.json", timeout=10)
+        # The spec lives on a different host, so don't send it the API key
+        request = client.build_request("GET", OPENAPI_SPEC_URL, timeout=10)
+        request.url = request.url.copy_remove_param("key")
+        response = await client.send(request)
         response.raise_for_status()
-        spec = response.json()
+        # orjson parses the large, deeply nested spec several times faster than json
+        spec = orjson.loads(response.content)
         print(f"✅ Loaded OpenAPI spec with {len(spec.get('paths', {}))} endpoints")
+        _write_cached_spec(cache_path, spec)
         return spec
-    except httpx.RequestError as e:
+    except (httpx.RequestError, httpx.HTTPStatusError, orjson.JSONDecodeError) as e:
+        # Fall back to a stale copy rather than failing to start, including
+        # when the body is truncated or an HTML error page
+        spec = _read_cached_spec(cache_path)
+        if spec is not None:
+            print("⚠️  Could not refresh OpenAPI spec, using cached copy")
+            return spec
+        if isinstance(e, httpx.HTTPStatusError):
+            raise RuntimeError(f"HTTP error loading OpenAPI spec: {e.response.status_code}")
         raise RuntimeError(f"Failed to load OpenAPI specification: {e}")
-    except httpx.HTTPStatusError as e:
-        raise RuntimeError(f"HTTP error loading OpenAPI spec: {e.response.status_code}")
+
+def _parse_routes_cached(openapi_spec: dict, cache_dir: Optional[Path] = None) -> list:
+    """
+    Parse the OpenAPI spec into FastMCP's HTTP routes, reusing a copy saved
+    by an earlier run when the spec and FastMCP version are unchanged.
+    
+    The routes are stored as JSON and validated back into FastMCP's Pydantic
+    models, so a tampered cache file can at worst fail validation; unlike a
+    pickle, loading it never runs code.
+    
+    Args:
+        openapi_spec: The OpenAPI specification
+        cache_dir: Directory holding the saved routes; defaults to the spec cache's
+    
+    Returns:
+        list: FastMCP HTTPRoute objects
+    """
+    import fastmcp
+    from fastmcp.utilities import openapi
+    from pydantic import TypeAdapter
+    
+    cache_dir = cache_dir or OPENAPI_CACHE_PATH.parent
+    digest = hashlib.sha256(
+        fastmcp.__version__.encode() + orjson.dumps(openapi_spec, option=orjson.OPT_SORT_KEYS)
+    ).hexdigest()[:16]
+    cache_path = cache_dir / f"routes-{digest}.json"
+    adapter = TypeAdapter(list[openapi.HTTPRoute])
+    
+    try:
+        return adapter.validate_json(cache_path.read_bytes())
+    except (OSError, ValueError):
+        # Missing, unreadable, or not valid routes (pydantic's ValidationError is a ValueError)
+        pass
+    
+    routes = openapi.parse_openapi_to_http_routes(openapi_spec)
+    try:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = cache_path.with_suffix(".tmp")
+        tmp_path.write_bytes(adapter.dump_json(routes))
+        tmp_path.replace(cache_path)
+    except (OSError, ValueError):
+        pass
+    return routes
+
+@contextmanager
+def _cached_route_parsing(openapi_spec: dict):
+    """
+    Make FastMCP.from_openapi use routes from _parse_routes_cached instead of
+    parsing the spec again.
+    
+    FastMCP offers no hook for this, so its parser is swapped out, but only for
+    the duration of the block and only for this exact spec object; any other
+    spec is still handed to the real parser.
+    """
+    from fastmcp.utilities import openapi
+    
+    routes = _parse_routes_cached(openapi_spec)
+    parse = openapi.parse_openapi_to_http_routes
+    openapi.parse_openapi_to_http_routes = lambda spec: routes if spec is openapi_spec else parse(spec)
+    try:
+        yield
+    finally:
+        openapi.parse_openapi_to_http_routes = parse
 
 def create_route_maps() -> list[RouteMap]:
     """
     Create custom route mappings for better MCP integration.
     
+    Rules are checked in order and the first match wins, so more specific
+    patterns must come before the catch-all. Patterns are compiled once here
+    rather than by FastMCP for every route it classifies.
+    
     Returns:
         list[RouteMap]: List of route mapping configurations
     """
+    from fastmcp.server.openapi import RouteMap, MCPType
+    
     return [
         # Map GET requests with path parameters (like /shodan/host/{ip}) to ResourceTemplate
         RouteMap(
             methods=["GET"], 
-            pattern=r".*\{.*\}.*", 
+            pattern=re.compile(r".*\{.*\}.*"), 
             mcp_type=MCPType.RESOURCE_TEMPLATE
         ),
         # Map search endpoints to Tools for better discoverability
         RouteMap(
             methods=["GET"], 
-            pattern=r".*/search.*", 
+            pattern=re.compile(r".*/search.*"), 
             mcp_type=MCPType.TOOL
         ),
         # Map count endpoints to Tools
         RouteMap(
             methods=["GET"], 
-            pattern=r".*/count.*", 
+            pattern=re.compile(r".*/count.*"), 
             mcp_type=MCPType.TOOL
         ),
         # Map DNS endpoints to Tools
         RouteMap(
             methods=["GET"], 
-            pattern=r".*/dns/.*", 
+            pattern=re.compile(r".*/dns/.*"), 
             mcp_type=MCPType.TOOL
         ),
         # Map scan endpoints to Tools
         RouteMap(
             methods=["POST", "GET"], 
-            pattern=r".*/scan.*", 
+            pattern=re.compile(r".*/scan.*"), 
             mcp_type=MCPType.TOOL
         ),
         # Map account and API info to Resources
         RouteMap(
             methods=["GET"], 
-            pattern=r".*/account/.*|.*/api-info.*", 
+            pattern=re.compile(r".*/account/.*|.*/api-info.*"), 
             mcp_type=MCPType.RESOURCE
         ),
         # Default: map all other GET requests to Resources
         RouteMap(
             methods=["GET"], 
-            pattern=r".*", 
+            pattern=re.compile(r".*"), 
             mcp_type=MCPType.RESOURCE
         ),
     ]
 
-def create_mcp_server() -> FastMCP:
+async def create_mcp_server() -> FastMCP:
     """
     Create and configure the Shodan MCP server using OpenAPI integration.
     
     Returns:
         FastMCP: Configured MCP server
     """
-    # Load OpenAPI specification
-    openapi_spec = load_openapi_spec()
+    from fastmcp import FastMCP
+    
+    # Create HTTP client; it carries the API key on every request
+    client = create_shodan_client(get_api_key())
     
-    # Create HTTP client
-    client = create_shodan_client()
+    # Load OpenAPI specification over the same client
+    openapi_spec = await load_openapi_spec(client)
     
     # Create route mappings for better organization
     route_maps = create_route_maps()
     
-    # Create MCP server from OpenAPI spec
+    # Create MCP server from OpenAPI spec. The generated tools hold the live
+    # HTTP client, so only the parsed routes can be reused across restarts.
     print("🔧 Creating MCP server from OpenAPI specification...")
-    mcp = FastMCP.from_openapi(
-        openapi_spec=openapi_spec,
-        client=client,
-        name="ShodanMCPServer",
-        description="Shodan cybersecurity search engine MCP server with full API access",
-        route_maps=route_maps
-    )
-    
-    # Add custom authentication middleware
-    @mcp.middleware("request")
-    async def add_api_key(request, call_next):
-        """Add Shodan API key to all requests."""
-        api_key = get_api_key()
-        
-        # Add API key as query parameter (Shodan's preferred method)
-        if hasattr(request, 'url'):
-            # For httpx requests, add to params
-            if not hasattr(request, 'params'):
-                request.params = {}
-            request.params['key'] = api_key
-        
-        return await call_next(request)
+    with _cached_route_parsing(openapi_spec) if ROUTE_CACHE_ENABLED else nullcontext():
+        mcp = FastMCP.from_openapi(
+            openapi_spec=openapi_spec,
+            client=client,
+            name="ShodanMCPServer",
+            instructions="Shodan cybersecurity search engine MCP server with full API access",
+            route_maps=route_maps
+        )
     
     print("✅ MCP server created successfully")
     return mcp
 
+async def serve() -> None:
+    """
+    Create the Shodan MCP server and run it over stdio.
+    """
+    mcp = await create_mcp_server()
+    
+    print("\n📋 Server Information:")
+    print("- Name: Shodan MCP Server")
+    print("- Base URL: https://api.shodan.io")
+    print("- Transport: stdio")
+    print("- Authentication: API Key (from SHODAN_API_KEY env var)")
+    
+    print("\n🛠️  Available Tools (auto-generated from OpenAPI):")
+    print("- Host search and information retrieval")
+    print("- DNS resolution and reverse lookup")
+    print("- Account and API information")
+    print("- Internet scanning capabilities")
+    print("- Search facets and filters")
+    print("- And many more based on Shodan's full API")
+    
+    print("\n📚 Usage:")
+    print("Set your API key: export SHODAN_API_KEY='your_key_here'")
+    print("Get a free API key at: https://account.shodan.io/register")
+    
+    print("\n🔄 Starting server...")
+    
+    # Run the MCP server
+    await mcp.run_async(transport="stdio")
+
 def main():
     """
     Main function to create and run the Shodan MCP server.
@@ -177,31 +564,9 @@ def main():
         api_key = get_api_key()
         print(f"🔑 API Key found: {api_key[:8]}...")
         
-        # Create MCP server
-        mcp = create_mcp_server()
-        
-        print("\n📋 Server Information:")
-        print("- Name: Shodan MCP Server")
-        print("- Base URL: https://api.shodan.io")
-        print("- Transport: stdio")
-        print("- Authentication: API Key (from SHODAN_API_KEY env var)")
-        
-        print("\n🛠️  Available Tools (auto-generated from OpenAPI):")
-        print("- Host search and information retrieval")
-        print("- DNS resolution and reverse lookup")
-        print("- Account and API information")
-        print("- Internet scanning capabilities")
-        print("- Search facets and filters")
-        print("- And many more based on Shodan's full API")
-        
-        print("\n📚 Usage:")
-        print("Set your API key: export SHODAN_API_KEY='your_key_here'")
-        print("Get a free API key at: https://account.shodan.io/register")
-        
-        print("\n🔄 Starting server...")
-        
-        # Run the MCP server
-        mcp.run(transport="stdio")
+        # Create and run the MCP server in one event loop, so the connection
+        # opened to fetch the spec stays usable for tool calls
+        asyncio.run(serve())
         
     except ValueError as e:
         print(f"❌ Configuration Error: {e}")